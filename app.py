@@ -1,19 +1,36 @@
+import asyncio
+import functools
+import gzip
+import hashlib
+import hmac
 import math
+import os
+import threading
 import time
 import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from urllib.parse import urlparse, unquote
+from email.utils import formatdate
+from urllib.parse import unquote
 from typing import Optional, Dict, Any, List
 
-import requests
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+import aiohttp
+import brotli
+import numpy as np
+from numba import njit
+import orjson
+from aiohttp_client_cache import CachedSession, SQLiteBackend
+from aiohttp_client_cache.cache_control import DO_NOT_CACHE
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from zoneinfo import ZoneInfo  # Europe/Warsaw
 from skyfield.api import EarthSatellite, load, wgs84
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # -------------------- KONFIG --------------------
 HOME_LAT = 52.158026399080114
@@ -30,52 +47,210 @@ WARSAW_TZ = ZoneInfo("Europe/Warsaw")
 # Ludzie w kosmosie (bogate API)
 PEOPLE_URL = "https://corquaid.github.io/international-space-station-APIs/JSON/people-in-space.json"
 
+# Wikipedia (stałe prefiksy, żeby nie składać stringów/parsować URL-i przy każdym zapytaniu)
+WIKI_PATH_PREFIX = "/wiki/"
+WIKI_EN_MARKER = "://en."  # np. https://en.wikipedia.org/..., https://en.m.wikipedia.org/...
+PL_SUMMARY_URL = "https://pl.wikipedia.org/api/rest_v1/page/summary/"
+PL_WIKI_URL = "https://pl.wikipedia.org/wiki/"
+EN_API_URL = "https://en.wikipedia.org/w/api.php"
+
 # TLE ISS (do obliczania przelotów)
 TLE_URL = "https://api.wheretheiss.at/v1/satellites/25544/tles"
 TLE_TTL_SECONDS = 6 * 3600  # cache na 6h
+TLE_CACHE_PATH = ".tle_cache.json"  # kopia cache TLE na dysku (przeżywa restart procesu)
+PASSES_TTL_SECONDS = 15 * 60  # prognoza 48h praktycznie się nie zmienia w ciągu kwadransa
+PASSES_LIMIT = 10
+PASSES_HORIZON_HOURS = 48  # maksymalny horyzont prognozy
+PASSES_SCAN_STEP_HOURS = 24  # krok skanowania (dalej tylko, gdy brakuje przelotów)
+
+# prędkość liczona po oknie ostatnich odczytów (mniej szumu przy nieregularnym odpytywaniu)
+SPEED_WINDOW_FIXES = 8
+SPEED_WINDOW_SECONDS = 60  # starsze odczyty wyrzucamy: łuk przez pół orbity zaniża prędkość
+
+# wątki na obliczenia SGP4 (poza pętlą zdarzeń)
+PASSES_WORKERS = 4
+
+# cache odpowiedzi w pamięci: skład załogi zmienia się rzadko (start/powrót misji),
+# opisy z wikipedii praktycznie wcale
+PEOPLE_TTL_SECONDS = 3600
+WIKI_TTL_SECONDS = 24 * 3600
+WIKI_TITLES_PER_QUERY = 50  # limit `titles` w MediaWiki API
+
+# dyskowy cache HTTP z rewalidacją (ETag/Last-Modified -> 304 zamiast pełnej odpowiedzi);
+# wpisy trzymamy dłużej niż cache w pamięci, żeby po jego wygaśnięciu było co rewalidować
+HTTP_CACHE_PATH = ".httpcache.sqlite"
+HTTP_CACHE_EXPIRE_AFTER = {
+    "corquaid.github.io": 7 * 24 * 3600,
+    "*.wikipedia.org": 7 * 24 * 3600,
+}
+
+# pula połączeń HTTP (keep-alive do upstreamów)
+HTTP_POOL_MAXSIZE = 32
+HTTP_POOL_PER_HOST = 16
+HTTP_KEEPALIVE_SECONDS = 60
+
+# /admin/flush: sekret z env (ADMIN_TOKEN); bez niego endpoint jest wyłączony.
+# Za nginx-em każdy klient ma adres 127.0.0.1, więc sam adres niczego nie chroni.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# strona główna: wczytana i skompresowana raz, przeglądarka rewaliduje po ETag
+INDEX_PATH = "static/index.html"
+INDEX_MAX_AGE_SECONDS = 3600
 
 # -------------------- STAN (w pamięci procesu) --------------------
-_last_fix: Optional[Dict[str, Any]] = None  # {"lat": float, "lon": float, "t": int}
+_fixes: deque = deque(maxlen=SPEED_WINDOW_FIXES)  # (lat, lon, t)
 _tle_cache: Dict[str, Any] = {"ts": 0, "name": None, "line1": None, "line2": None}
+_sat_cache: Dict[str, Any] = {"key": None, "sat": None, "observer": None}
+_sat_lock = threading.Lock()  # get_satellite woła się z wątków puli
+_passes_cache: Dict[str, Any] = {"key": None, "ts": 0, "passes": None}
+_ttl_caches: List[TTLCache] = []  # wszystkie cache z @ttl_cached (do /admin/flush)
+_pl_titles: Dict[str, Any] = {"task": None}  # zadanie prefetchu EN->PL tytułów załogi
+_background_tasks: set = set()  # referencje do zadań "w tle", żeby GC ich nie ubił
+
+
+# -------------------- CACHE --------------------
+def ttl_cached(ttl: int, maxsize: int = 256):
+    """
+    Cache w pamięci dla async helperów, klucz = argumenty wywołania.
+    Równoległe chybienia dla tego samego klucza czekają na jedno wspólne zapytanie
+    (także gdy się nie uda - błąd dostają wszyscy naraz, kolejne wywołanie próbuje od nowa).
+    """
+    def decorator(fn):
+        cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        inflight: Dict[Any, asyncio.Task] = {}
+        _ttl_caches.append(cache)
+
+        async def fill(args):
+            try:
+                value = await fn(*args)
+                cache[args] = value
+                return value
+            finally:
+                inflight.pop(args, None)
+
+        @functools.wraps(fn)
+        async def wrapper(*args):
+            try:
+                return cache[args]
+            except KeyError:
+                pass
+            task = inflight.get(args)
+            if task is None:
+                task = inflight[args] = asyncio.create_task(fill(args))
+                # błąd odebrany nawet wtedy, gdy wszyscy czekający zostali anulowani
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            # shield: anulowanie jednego klienta nie przerywa zapytania pozostałym
+            return await asyncio.shield(task)
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def run_in_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
 
 # -------------------- HELPERY --------------------
-def fetch_json(url: str, timeout: int = 12) -> Dict[str, Any]:
-    r = requests.get(url, timeout=timeout, headers={"User-Agent": "ISS-demo/1.0 (educational)"})
-    r.raise_for_status()
-    return r.json()
+async def fetch_json(url: str, params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # refresh=True: wpis z dysku zawsze warunkowo rewalidowany (If-None-Match / If-Modified-Since)
+    async with app.state.http.get(url, params=params, refresh=True) as r:
+        r.raise_for_status()
+        return orjson.loads(await r.read())
+
+
+_D2R = 0.017453292519943295  # pi / 180
+_R_KM = 6371.0
+
+
+def haversine_km_vec(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Wersja wektorowa (NumPy, z broadcastingiem) - np. cała trasa przelotu vs HOME naraz
+    """
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    dphi = (lat2 - lat1) * _D2R
+    dlmb = np.subtract(lon2, lon1, dtype=np.float64) * _D2R
+    s1 = np.sin(dphi * 0.5)
+    s2 = np.sin(dlmb * 0.5)
+    a = s1 * s1 + np.cos(lat1 * _D2R) * np.cos(lat2 * _D2R) * s2 * s2
+    return 2 * _R_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
 
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+    # skalarnie czysty `math` jest szybszy niż NumPy na tablicach 0-d
+    dphi = (lat2 - lat1) * _D2R
+    dlmb = (lon2 - lon1) * _D2R
+    s1 = math.sin(dphi * 0.5)
+    s2 = math.sin(dlmb * 0.5)
+    a = s1 * s1 + math.cos(lat1 * _D2R) * math.cos(lat2 * _D2R) * s2 * s2
+    return 2 * _R_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+# -------------------- NUMBA (do obliczeń wsadowych po stronie serwera) --------------------
+@njit(cache=True, fastmath=True)
+def haversine_km_nb(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dphi = (lat2 - lat1) * _D2R
+    dlmb = (lon2 - lon1) * _D2R
+    s1 = math.sin(dphi * 0.5)
+    s2 = math.sin(dlmb * 0.5)
+    a = s1 * s1 + math.cos(lat1 * _D2R) * math.cos(lat2 * _D2R) * s2 * s2
+    return 2 * _R_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+@njit(cache=True, fastmath=True)
+def haversine_batch(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """
+    Odległości parami dla tablic float64 tej samej długości.
+    Bez parallel=True: kernel równoległy (TBB) odpalony z wątku puli blokuje wyjście procesu.
+    """
+    n = lats1.shape[0]
+    out = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        out[i] = haversine_km_nb(lats1[i], lons1[i], lats2[i], lons2[i])
+    return out
+
 
+def warmup_numba() -> None:
+    # kompilacja (albo odczyt z cache na dysku) przy starcie, a nie przy pierwszym zapytaniu
+    pts = np.zeros(2, dtype=np.float64)
+    haversine_km_nb(0.0, 0.0, 1.0, 1.0)
+    haversine_batch(pts, pts, pts, pts)
+    az_to_cardinal_idx_nb(0.0)
 
-def fetch_iss_position_open_notify():
+
+async def fetch_iss_position_open_notify():
     # serwer->serwer, więc HTTP nie przeszkadza
-    data = fetch_json("http://api.open-notify.org/iss-now.json")
+    data = await fetch_json("http://api.open-notify.org/iss-now.json")
     lat = float(data["iss_position"]["latitude"])
     lon = float(data["iss_position"]["longitude"])
     ts = int(data["timestamp"])
     return lat, lon, ts
 
 
-def get_people_data():
-    return fetch_json(PEOPLE_URL)
+# pola osoby, które zwracamy na froncie
+PERSON_KEYS = ("id", "name", "country", "agency", "position", "spacecraft", "image", "url")
+
 
+@ttl_cached(PEOPLE_TTL_SECONDS, maxsize=1)
+async def get_people_data():
+    data = await fetch_json(PEOPLE_URL)
+    # w cache trzymamy tylko PERSON_KEYS (bez biografii/metadanych zdjęć), każde pole obecne
+    data["people"] = [{k: p.get(k) for k in PERSON_KEYS} for p in data.get("people", [])]
+    prefetch_pl_titles(data["people"])
+    return data
 
-def get_tle():
+
+async def get_tle():
     now = int(time.time())
     if _tle_cache["line1"] and (now - _tle_cache["ts"] < TLE_TTL_SECONDS):
         return _tle_cache["name"], _tle_cache["line1"], _tle_cache["line2"]
 
-    data = fetch_json(TLE_URL)
+    data = await fetch_json(TLE_URL)
     name = data.get("name") or "ISS (ZARYA)"
     line1 = data.get("line1")
     line2 = data.get("line2")
@@ -83,63 +258,159 @@ def get_tle():
         raise HTTPException(502, "Nie udało się pobrać TLE dla ISS")
 
     _tle_cache.update({"ts": now, "name": name, "line1": line1, "line2": line2})
+    save_tle_cache()
     return name, line1, line2
 
 
+def save_tle_cache() -> None:
+    # zapis atomowy: najpierw plik tymczasowy, potem os.replace
+    tmp = TLE_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(_tle_cache))
+        os.replace(tmp, TLE_CACHE_PATH)
+    except OSError:
+        pass  # brak zapisu na dysk nie może psuć odpowiedzi
+
+
+def remove_tle_cache() -> None:
+    # po /admin/flush restart nie może wczytać z dysku właśnie unieważnionego TLE
+    try:
+        os.remove(TLE_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def load_tle_cache() -> None:
+    try:
+        with open(TLE_CACHE_PATH, "rb") as f:
+            data = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return
+    if not isinstance(data, dict) or not (data.get("line1") and data.get("line2")):
+        return
+    if int(time.time()) - int(data.get("ts") or 0) < TLE_TTL_SECONDS:
+        _tle_cache.update({k: data.get(k) for k in ("ts", "name", "line1", "line2")})
+
+
+load_tle_cache()
+
+
+def get_satellite(name: str, line1: str, line2: str):
+    """
+    EarthSatellite + obserwator, odtwarzane tylko gdy zmieni się TLE
+    """
+    key = (line1, line2)
+    ts = app.state.ts
+    with _sat_lock:
+        if _sat_cache["key"] != key:
+            _sat_cache.update(
+                {
+                    "key": key,
+                    "sat": EarthSatellite(line1, line2, name, ts),
+                    "observer": wgs84.latlon(HOME_LAT, HOME_LON),
+                }
+            )
+        return ts, _sat_cache["sat"], _sat_cache["observer"]
+
+
 def wiki_title_from_url(url: str) -> Optional[str]:
     """
     https://en.wikipedia.org/wiki/Wu_Fei_(taikonaut) -> Wu_Fei_(taikonaut)
     """
     try:
-        path = urlparse(url).path
-        if not path.startswith("/wiki/"):
+        _, sep, rest = url.partition(WIKI_PATH_PREFIX)
+        if not sep:
             return None
-        return unquote(path[len("/wiki/"):])
+        return unquote(rest.partition("#")[0].partition("?")[0])
     except Exception:
         return None
 
 
-def wiki_pl_summary_by_title(title: str) -> Dict[str, Any]:
-    encoded = urllib.parse.quote(title, safe="")
-    url = f"https://pl.wikipedia.org/api/rest_v1/page/summary/{encoded}"
+@ttl_cached(WIKI_TTL_SECONDS)
+async def _wiki_pl_summary_cached(title: str) -> Dict[str, Any]:
+    # w cache trafia sukces albo 404 (brak PL artykułu); timeouty/5xx lecą dalej,
+    # żeby następne wyświetlenie spróbowało ponownie
+    url = PL_SUMMARY_URL + urllib.parse.quote(title, safe="")
     try:
-        data = fetch_json(url, timeout=10)
-        return {
-            "ok": True,
-            "title": data.get("title"),
-            "extract": data.get("extract"),
-            "thumbnail": (data.get("thumbnail") or {}).get("source"),
-            "content_url": (data.get("content_urls") or {}).get("desktop", {}).get("page"),
-        }
+        data = await fetch_json(url)
+    except aiohttp.ClientResponseError as e:
+        if e.status == 404:
+            return {"ok": False}
+        raise
+    return {
+        "ok": True,
+        "title": data.get("title"),
+        "extract": data.get("extract"),
+        "thumbnail": (data.get("thumbnail") or {}).get("source"),
+        "content_url": (data.get("content_urls") or {}).get("desktop", {}).get("page"),
+    }
+
+
+async def wiki_pl_summary_by_title(title: str) -> Dict[str, Any]:
+    try:
+        return await _wiki_pl_summary_cached(title)
     except Exception:
         return {"ok": False}
 
 
-def wiki_pl_title_from_en_title(en_title: str) -> Optional[str]:
+async def wiki_pl_titles_from_en_titles(en_titles: List[str]) -> Dict[str, Optional[str]]:
     """
-    MediaWiki langlinks: EN title -> PL title (jeśli istnieje)
+    MediaWiki langlinks hurtem: EN tytuły -> PL tytuły (do 50 tytułów w jednym zapytaniu)
     """
-    api = "https://en.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "format": "json",
-        "titles": en_title,
-        "prop": "langlinks",
-        "lllang": "pl",
-        "lllimit": "1",
-    }
-    try:
-        r = requests.get(api, params=params, timeout=10, headers={"User-Agent": "ISS-demo/1.0"})
-        r.raise_for_status()
-        data = r.json()
-        pages = (data.get("query") or {}).get("pages") or {}
-        for _, page in pages.items():
+    out: Dict[str, Optional[str]] = {}
+    for i in range(0, len(en_titles), WIKI_TITLES_PER_QUERY):
+        chunk = en_titles[i:i + WIKI_TITLES_PER_QUERY]
+        params = {
+            "action": "query",
+            "format": "json",
+            "titles": "|".join(chunk),
+            "prop": "langlinks",
+            "lllang": "pl",
+            "lllimit": "max",  # limit liczony łącznie dla wszystkich stron
+        }
+        try:
+            data = await fetch_json(EN_API_URL, params=params)
+        except Exception:
+            continue
+        query = data.get("query") or {}
+        pl_by_title: Dict[str, Optional[str]] = {}
+        for page in (query.get("pages") or {}).values():
             ll = page.get("langlinks")
-            if ll and isinstance(ll, list) and len(ll) > 0:
-                return ll[0].get("*") or ll[0].get("title")
-        return None
-    except Exception:
-        return None
+            pl_by_title[page.get("title")] = (ll[0].get("*") or ll[0].get("title")) if ll else None
+        # API normalizuje tytuły (Wu_Fei_(taikonaut) -> Wu Fei (taikonaut)), mapujemy z powrotem
+        normalized = {n.get("from"): n.get("to") for n in query.get("normalized") or []}
+        for t in chunk:
+            out[t] = pl_by_title.get(normalized.get(t, t))
+    return out
+
+
+def prefetch_pl_titles(people: List[Dict[str, Any]]) -> None:
+    # jedno zapytanie o PL tytuły dla całej załogi (przy każdym odświeżeniu listy ludzi)
+    titles = []
+    for p in people:
+        url = p.get("url")
+        if url and WIKI_EN_MARKER in url:
+            title = wiki_title_from_url(url)
+            if title:
+                titles.append(title)
+    _pl_titles["task"] = run_in_background(wiki_pl_titles_from_en_titles(titles))
+
+
+async def wiki_pl_title_from_en_title(en_title: str) -> Optional[str]:
+    """
+    EN title -> PL title (jeśli istnieje), z mapy zbudowanej przez prefetch_pl_titles
+    """
+    task = _pl_titles["task"]
+    if task is not None:
+        # shield: anulowanie jednego zapytania nie może zabić wspólnego prefetchu
+        try:
+            titles = await asyncio.shield(task)
+        except Exception:
+            titles = {}
+        if en_title in titles:
+            return titles[en_title]
+    return (await wiki_pl_titles_from_en_titles([en_title])).get(en_title)
 
 
 def dumb_down_pl(
@@ -167,33 +438,99 @@ def dumb_down_pl(
     return " ".join(bits)
 
 
+_CARD_DIRS = ["północy", "północnego wschodu", "wschodu", "południowego wschodu",
+              "południa", "południowego zachodu", "zachodu", "północnego zachodu"]
+# tablica co 0.1° -> bez dzielenia/zaokrąglania przy każdym wywołaniu
+_CARD_IDX_LUT = np.array([int((a / 450.0) + 0.5) % 8 for a in range(3600)], dtype=np.int8)
+_CARD_LUT = [_CARD_DIRS[i] for i in _CARD_IDX_LUT]
+_CARD_LUT_ARR = np.array(_CARD_LUT, dtype=object)
+
+
 def az_to_cardinal_pl(az_deg: float) -> str:
     """
     8-kierunkowy opis po polsku: północ/wschód/...
     """
-    dirs = ["północy", "północnego wschodu", "wschodu", "południowego wschodu",
-            "południa", "południowego zachodu", "zachodu", "północnego zachodu"]
-    idx = int((az_deg % 360) / 45.0 + 0.5) % 8
-    return dirs[idx]
+    return _CARD_LUT[int(az_deg * 10) % 3600]
+
+
+def az_to_cardinal_pl_vec(az_deg) -> np.ndarray:
+    """
+    To samo dla tablicy azymutów (jedno np.take zamiast pętli)
+    """
+    idx = (np.asarray(az_deg, dtype=np.float64) * 10).astype(np.int32) % 3600
+    return np.take(_CARD_LUT_ARR, idx)
+
+
+@njit(cache=True)
+def az_to_cardinal_idx_nb(az_deg: float) -> int:
+    """
+    Wersja numba: indeks w _CARD_DIRS (stringi zostają po stronie Pythona)
+    """
+    return _CARD_IDX_LUT[int(az_deg * 10) % 3600]
+
+
+# -------------------- CYKL ŻYCIA --------------------
+@app.on_event("startup")
+async def startup():
+    # skala czasu z danych wbudowanych w skyfield: bez pobierania plików leap-second
+    # z sieci przy pierwszym /api/passes
+    app.state.ts = load.timescale(builtin=True)
+    app.state.pool = ThreadPoolExecutor(max_workers=PASSES_WORKERS, thread_name_prefix="passes")
+    warmup_numba()  # w głównym wątku, przed pierwszym zapytaniem
+    app.state.index = load_index()
+
+    # jedna sesja na cały proces: współdzielona pula połączeń (keep-alive) zamiast
+    # nowego TCP+TLS co zapytanie do wikipedii / wheretheiss / corquaid
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_MAXSIZE,
+        limit_per_host=HTTP_POOL_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+        ttl_dns_cache=300,
+    )
+    cache = SQLiteBackend(
+        HTTP_CACHE_PATH,
+        # m.in. bieżąca pozycja ISS - nigdy z cache; TLE też nie (brak walidatorów,
+        # a pamięć + .tle_cache.json i tak go trzymają)
+        expire_after=DO_NOT_CACHE,
+        urls_expire_after=HTTP_CACHE_EXPIRE_AFTER,
+        cache_control=True,
+    )
+    app.state.http = CachedSession(
+        cache=cache,
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=12),
+        headers={"User-Agent": "ISS-demo/1.0 (educational)"},
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.http.close()
+    app.state.pool.shutdown(wait=False, cancel_futures=True)
 
 
 # -------------------- ENDPOINTY --------------------
 @app.get("/api/status")
-def api_status():
-    global _last_fix
-
-    lat, lon, ts = fetch_iss_position_open_notify()
-    people_data = get_people_data()
+async def api_status():
+    # pozycja i lista ludzi są niezależne -> pobieramy równolegle
+    (lat, lon, ts), people_data = await asyncio.gather(
+        fetch_iss_position_open_notify(),
+        get_people_data(),
+    )
     people_count = int(people_data.get("number", 0))
 
+    # ten sam odczyt (kilku klientów w tej samej sekundzie) nie zapycha okna
+    if not _fixes or ts > _fixes[-1][2]:
+        _fixes.append((lat, lon, ts))
+    while ts - _fixes[0][2] > SPEED_WINDOW_SECONDS:
+        _fixes.popleft()
+
     speed_kmh = None
-    if _last_fix:
-        dt = ts - _last_fix["t"]
+    if len(_fixes) >= 2:
+        lat0, lon0, t0 = _fixes[0]
+        dt = ts - t0
         if dt > 0:
-            dist = haversine_km(_last_fix["lat"], _last_fix["lon"], lat, lon)
-            speed_kmh = (dist / dt) * 3600.0
-
-    _last_fix = {"lat": lat, "lon": lon, "t": ts}
+            speed_kmh = (haversine_km(lat0, lon0, lat, lon) / dt) * 3600.0
 
     return {
         "iss": {"latitude": lat, "longitude": lon, "timestamp": ts, "speed_kmh": speed_kmh},
@@ -207,34 +544,19 @@ def api_status():
 
 
 @app.get("/api/people")
-def api_people():
-    data = get_people_data()
-    people = data.get("people", [])
-    slim = []
-    for p in people:
-        slim.append(
-            {
-                "id": p.get("id"),
-                "name": p.get("name"),
-                "country": p.get("country"),
-                "agency": p.get("agency"),
-                "position": p.get("position"),
-                "spacecraft": p.get("spacecraft"),
-                "image": p.get("image"),
-                "url": p.get("url"),
-            }
-        )
+async def api_people():
+    data = await get_people_data()
     return {
         "number": data.get("number"),
-        "people": slim,
+        "people": data.get("people", []),  # już przycięte do PERSON_KEYS w get_people_data
         "iss_expedition": data.get("iss_expedition"),
         "expedition_patch": data.get("expedition_patch"),
     }
 
 
 @app.get("/api/person/{person_id}")
-def api_person(person_id: int):
-    data = get_people_data()
+async def api_person(person_id: int):
+    data = await get_people_data()
     people = data.get("people", [])
     p = next((x for x in people if x.get("id") == person_id), None)
     if not p:
@@ -255,32 +577,38 @@ def api_person(person_id: int):
         title = wiki_title_from_url(wiki_url)
 
         if title:
-            # 1) spróbuj PL summary dla tego samego tytułu
-            pl = wiki_pl_summary_by_title(title)
+            is_en = WIKI_EN_MARKER in wiki_url
+            # 1) PL summary dla tego samego tytułu, a dla źródła EN od razu (spekulatywnie)
+            #    szukamy PL tytułu - przy chybieniu nie czekamy dwóch RTT po kolei
+            pl_task = asyncio.create_task(wiki_pl_summary_by_title(title))
+            ll_task = asyncio.create_task(wiki_pl_title_from_en_title(title)) if is_en else None
+
+            pl = await pl_task
             if pl.get("ok"):
+                if ll_task:
+                    # niepotrzebny; prefetch mapy tytułów jest pod shield, więc nie ginie
+                    ll_task.cancel()
                 wiki = {
                     "ok": True,
                     "link": pl.get("content_url") or wiki_url,
                     "thumbnail": pl.get("thumbnail"),
                     "extract": pl.get("extract"),
                 }
-            else:
-                # 2) jeśli źródło EN, spróbuj znaleźć PL tytuł
-                host = urlparse(wiki_url).netloc.lower()
-                if host.startswith("en."):
-                    pl_title = wiki_pl_title_from_en_title(title)
-                    if pl_title:
-                        pl2 = wiki_pl_summary_by_title(pl_title)
-                        if pl2.get("ok"):
-                            wiki = {
-                                "ok": True,
-                                "link": pl2.get("content_url") or wiki_url,
-                                "thumbnail": pl2.get("thumbnail"),
-                                "extract": pl2.get("extract"),
-                            }
-                        else:
-                            wiki["link"] = f"https://pl.wikipedia.org/wiki/{urllib.parse.quote(pl_title, safe='')}"
-                # jeśli nie EN: zostaje link z JSON-a jako fallback
+            elif ll_task:
+                # 2) źródło EN: PL tytuł jest już (prawie) gotowy
+                pl_title = await ll_task
+                if pl_title:
+                    pl2 = await wiki_pl_summary_by_title(pl_title)
+                    if pl2.get("ok"):
+                        wiki = {
+                            "ok": True,
+                            "link": pl2.get("content_url") or wiki_url,
+                            "thumbnail": pl2.get("thumbnail"),
+                            "extract": pl2.get("extract"),
+                        }
+                    else:
+                        wiki["link"] = PL_WIKI_URL + urllib.parse.quote(pl_title, safe="")
+            # jeśli nie EN: zostaje link z JSON-a jako fallback
 
     simple = dumb_down_pl(name, country, agency, position, spacecraft, wiki.get("extract"))
 
@@ -298,74 +626,189 @@ def api_person(person_id: int):
 
 
 @app.get("/api/passes")
-def api_passes():
-    sat_name, l1, l2 = get_tle()
-    ts = load.timescale()
-    satellite = EarthSatellite(l1, l2, sat_name, ts)
+async def api_passes():
+    sat_name, l1, l2 = await get_tle()
+
+    now = int(time.time())
+    if _passes_cache["key"] == (l1, l2) and (now - _passes_cache["ts"] < PASSES_TTL_SECONDS):
+        out = _passes_cache["passes"]
+    else:
+        # SGP4 to czysty CPU (dziesiątki ms) - nie blokujemy pętli zdarzeń
+        loop = asyncio.get_running_loop()
+        out = await loop.run_in_executor(app.state.pool, compute_passes, sat_name, l1, l2)
+        _passes_cache.update({"key": (l1, l2), "ts": now, "passes": out})
+
+    return {
+        "home": {"lat": HOME_LAT, "lon": HOME_LON},
+        "min_elev_deg": MIN_ELEV_DEG,
+        "passes": out[:PASSES_LIMIT],
+    }
+
 
-    observer = wgs84.latlon(HOME_LAT, HOME_LON)
+def compute_passes(sat_name: str, l1: str, l2: str) -> List[Dict[str, Any]]:
+    ts, satellite, observer = get_satellite(sat_name, l1, l2)
 
     start = datetime.now(timezone.utc)
-    end = start + timedelta(days=2)  # 48h
+    horizon = start + timedelta(hours=PASSES_HORIZON_HOURS)
+
+    # skanujemy oknami po 24h i kończymy, gdy mamy już komplet przelotów
+    out: List[Dict[str, Any]] = []
+    t_from = start
+    while len(out) < PASSES_LIMIT:
+        t_to = min(t_from + timedelta(hours=PASSES_SCAN_STEP_HOURS), horizon)
+        passes, t_from = scan_passes(ts, satellite, observer, t_from, t_to)
+        out.extend(passes)
+        if t_to >= horizon:
+            break
 
+    return out
+
+
+def scan_passes(ts, satellite, observer, start: datetime, end: datetime):
+    """
+    Przeloty w oknie [start, end] + moment, od którego skanować dalej
+    (przed wschodem przelotu uciętego końcem okna, inaczej `end`)
+    """
     t0 = ts.from_datetime(start)
     t1 = ts.from_datetime(end)
 
     # events: 0=rise, 1=culminate, 2=set
     times, events = satellite.find_events(observer, t0, t1, altitude_degrees=MIN_ELEV_DEG)
 
+    # podział na przeloty (start_i, culm_i, end_i) - same indeksy w `times`
+    triples = []
+    start_i: Optional[int] = None
+    culm_i: Optional[int] = None
+    for i, e in enumerate(events):
+        if e == 0:
+            start_i, culm_i = i, None
+        elif e == 1 and start_i is not None:
+            culm_i = i
+        elif e == 2 and start_i is not None:
+            triples.append((start_i, culm_i, i))
+            start_i = None
+
+    resume = end
+    if start_i is not None:
+        resume = times[start_i].utc_datetime() - timedelta(minutes=1)
+
     out: List[Dict[str, Any]] = []
-    current: Dict[str, Any] = {}
+    if not triples:
+        return out, resume
+
+    # jedna (wektorowa) propagacja SGP4 dla wszystkich zdarzeń zamiast 3x .at() na przelot
+    alt_all, az_all, _dist = (satellite - observer).at(times).altaz()
+    alt_deg = alt_all.degrees
+    dirs_all = az_to_cardinal_pl_vec(az_all.degrees)
+    utc_all = times.utc_datetime()
+
+    for s_i, c_i, e_i in triples:
+        # kierunek: azymut na początku i na końcu
+        start_dir = dirs_all[s_i]
+        end_dir = dirs_all[e_i]
+        max_elev = float(alt_deg[c_i]) if c_i is not None else 0.0
+
+        # format dla taty
+        start_pl = utc_all[s_i].replace(tzinfo=timezone.utc).astimezone(WARSAW_TZ)
+        end_pl = utc_all[e_i].replace(tzinfo=timezone.utc).astimezone(WARSAW_TZ)
+        date_str = start_pl.strftime("%d.%m")
+        time_from = start_pl.strftime("%H:%M")
+        time_to = end_pl.strftime("%H:%M")
+
+        out.append(
+            {
+                "date": date_str,
+                "time_from": time_from,
+                "time_to": time_to,
+                "direction": f"z {start_dir} na {end_dir}",
+                "max_elev_deg": round(max_elev, 1),
+            }
+        )
 
-    for t, e in zip(times, events):
-        dt_utc = t.utc_datetime().replace(tzinfo=timezone.utc)
+    return out, resume
 
-        if e == 0:
-            current = {"start_t": t, "start_utc": dt_utc}
-        elif e == 1 and current:
-            alt, az, _dist = (satellite - observer).at(t).altaz()
-            current["max_utc"] = dt_utc
-            current["max_elev_deg"] = float(alt.degrees)
-        elif e == 2 and current:
-            current["end_t"] = t
-            current["end_utc"] = dt_utc
-
-            # kierunek: azymut na początku i na końcu
-            start_az = (satellite - observer).at(current["start_t"]).altaz()[1].degrees
-            end_az = (satellite - observer).at(current["end_t"]).altaz()[1].degrees
-
-            start_dir = az_to_cardinal_pl(float(start_az))
-            end_dir = az_to_cardinal_pl(float(end_az))
-
-            # format dla taty
-            start_pl = current["start_utc"].astimezone(WARSAW_TZ)
-            end_pl = current["end_utc"].astimezone(WARSAW_TZ)
-            date_str = start_pl.strftime("%d.%m")
-            time_from = start_pl.strftime("%H:%M")
-            time_to = end_pl.strftime("%H:%M")
-
-            out.append(
-                {
-                    "date": date_str,
-                    "time_from": time_from,
-                    "time_to": time_to,
-                    "direction": f"z {start_dir} na {end_dir}",
-                    "max_elev_deg": round(current.get("max_elev_deg", 0.0), 1),
-                }
-            )
-            current = {}
 
-    return {
-        "home": {"lat": HOME_LAT, "lon": HOME_LON},
-        "min_elev_deg": MIN_ELEV_DEG,
-        "passes": out[:10],
-    }
+@app.post("/admin/flush")
+async def admin_flush(request: Request):
+    # ręczne unieważnienie cache (np. zaraz po zmianie załogi)
+    token = request.headers.get("x-admin-token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(403, "Brak uprawnień")
+
+    for cache in _ttl_caches:
+        cache.clear()
+    await app.state.http.cache.clear()
+    _tle_cache.update({"ts": 0, "name": None, "line1": None, "line2": None})
+    remove_tle_cache()
+    _passes_cache.update({"key": None, "ts": 0, "passes": None})
+    _pl_titles["task"] = None
+    return {"flushed": len(_ttl_caches) + 2}
 
 
 # -------------------- FRONT --------------------
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+def load_index() -> Dict[str, Any]:
+    """
+    index.html w pamięci: wersje br / gzip / bez kompresji, każda z własnym ETagiem
+    """
+    with open(INDEX_PATH, "rb") as f:
+        raw = f.read()
+    digest = hashlib.md5(raw, usedforsecurity=False).hexdigest()
+    return {
+        "br": (brotli.compress(raw, quality=11), f'"{digest}-br"'),
+        "gzip": (gzip.compress(raw, compresslevel=9), f'"{digest}-gz"'),
+        "identity": (raw, f'"{digest}"'),
+        "last_modified": formatdate(os.path.getmtime(INDEX_PATH), usegmt=True),
+    }
+
+
+def pick_encoding(accept_encoding: str) -> str:
+    """
+    br > gzip > identity, z uwzględnieniem q-values (np. "gzip;q=1, br;q=0" -> gzip)
+    """
+    accepted, rejected = set(), set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        (accepted if q > 0 else rejected).add(token)
+
+    for encoding in ("br", "gzip"):
+        if encoding in accepted or ("*" in accepted and encoding not in rejected):
+            return encoding
+    return "identity"
+
+
 @app.get("/")
-def index():
-    return FileResponse("static/index.html")
+async def index(request: Request):
+    encoding = pick_encoding(request.headers.get("accept-encoding", ""))
+    body, etag = app.state.index[encoding]
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": app.state.index["last_modified"],
+        "Cache-Control": f"public, max-age={INDEX_MAX_AGE_SECONDS}",
+        "Vary": "Accept-Encoding",
+    }
+
+    # nginx z gzip potrafi zamienić ETag na słaby (W/"..."), więc porównujemy bez prefiksu
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="text/html", headers=headers)